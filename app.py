@@ -1,17 +1,24 @@
 import pathlib
 import textwrap
-import google.generativeai as genai
 import os
 import requests
 import re
+import time
+import threading
+from datetime import datetime, timedelta, timezone
 # New imports for .env and Google API
 from pathlib import Path
 from dotenv import load_dotenv
+import httplib2
+import google_auth_httplib2
+from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from slack_bolt import App
+from slack_sdk import WebClient
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from summarizer import summarize_text
 
 # Load environment variables from .env if present
 load_dotenv(dotenv_path=Path('.') / '.env')
@@ -23,11 +30,6 @@ def text_to_markdown(text):
     text = text.replace(".", "*")
     return textwrap.indent(text, '>', predicate=lambda _: True)
 
-# Set your Gemini API key
-os.environ["GEMINI_API_KEY"] = os.getenv("GEMINI_API_KEY", os.environ.get("GEMINI_API_KEY", ""))
-genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-model = genai.GenerativeModel("gemini-1.5-flash")
-
 # Google Docs API scopes and token path
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 TOKEN_PATH = 'token.json'
@@ -35,8 +37,16 @@ CREDENTIALS_PATH = 'credentials.json'  # Download this from Google Cloud Console
 
 SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
 SLACK_APP_TOKEN = os.environ["SLACK_APP_TOKEN"]
+# Overridable so replay.py can point every Web API call (including the
+# auth.test Bolt makes at startup) at a local stub
+SLACK_API_URL = os.environ.get("SLACK_API_URL")
+
+def build_slack_app():
+    if SLACK_API_URL:
+        return App(client=WebClient(token=SLACK_BOT_TOKEN, base_url=SLACK_API_URL))
+    return App(token=SLACK_BOT_TOKEN)
 
-app = App(token=SLACK_BOT_TOKEN)
+app = build_slack_app()
 
 def fetch_google_doc(doc_url):
     # Try public export first
@@ -51,22 +61,91 @@ def fetch_google_doc(doc_url):
     # If not public, try Google Drive API
     return fetch_private_google_doc(doc_id)
 
-def fetch_private_google_doc(doc_id):
-    creds = None
-    if os.path.exists(TOKEN_PATH):
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(TOKEN_PATH, 'w') as token:
+# Refresh the Drive token this long before it expires
+DRIVE_REFRESH_MARGIN = timedelta(minutes=5)
+
+class DriveClient:
+    # Long-lived Drive service: credentials are loaded once, refreshed ahead of
+    # expiry by a background thread, and the discovery document is parsed once
+    def __init__(self, token_path=TOKEN_PATH, credentials_path=CREDENTIALS_PATH):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self.lock = threading.Lock()
+        self.creds = None
+        self.service = None
+        self.local = threading.local()
+
+    def load_credentials(self):
+        creds = None
+        if os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+            self.save_credentials(creds)
+        return creds
+
+    def save_credentials(self, creds):
+        with open(self.token_path, 'w') as token:
             token.write(creds.to_json())
-    service = build('drive', 'v3', credentials=creds)
-    # Export as plain text
-    resp = service.files().export(fileId=doc_id, mimeType='text/plain').execute()
-    return resp.decode('utf-8') if isinstance(resp, bytes) else resp
+
+    def seconds_until_refresh(self):
+        if not self.creds.expiry:
+            return None
+        # google-auth keeps expiry as a naive UTC datetime
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return (self.creds.expiry - DRIVE_REFRESH_MARGIN - now).total_seconds()
+
+    def refresh(self):
+        # Callers hold self.lock, so concurrent requests never refresh twice
+        self.creds.refresh(Request())
+        self.save_credentials(self.creds)
+
+    def get_service(self):
+        with self.lock:
+            if self.creds is None:
+                self.creds = self.load_credentials()
+                threading.Thread(target=self.refresh_forever, daemon=True).start()
+            elif not self.creds.valid:
+                self.refresh()
+            if self.service is None:
+                self.service = build('drive', 'v3', credentials=self.creds, cache_discovery=False)
+            return self.service
+
+    def refresh_forever(self):
+        while True:
+            with self.lock:
+                wait = self.seconds_until_refresh()
+            if wait is None:
+                return
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            try:
+                with self.lock:
+                    self.refresh()
+            except Exception as e:
+                print(f"Failed to refresh Google Drive credentials: {e}")
+                time.sleep(60)
+
+    def http(self):
+        # httplib2 is not thread-safe, so each thread gets its own authorized connection
+        if not hasattr(self.local, "http"):
+            self.local.http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http())
+        return self.local.http
+
+    def export_text(self, doc_id):
+        service = self.get_service()
+        resp = service.files().export(fileId=doc_id, mimeType='text/plain').execute(http=self.http())
+        return resp.decode('utf-8') if isinstance(resp, bytes) else resp
+
+drive_client = DriveClient()
+
+def fetch_private_google_doc(doc_id):
+    return drive_client.export_text(doc_id)
 
 def resolve_short_link_to_page_id(base_url, short_link, email, api_token):
     url = f"{base_url}/wiki{short_link}"
@@ -88,20 +167,6 @@ def is_error_page(text):
     ]
     return any(sig.lower() in text.lower() for sig in error_signatures)
 
-def summarize_text(text):
-    prompt = (
-        "You are an expert technical writer. Read the following content and provide a structured summary. "
-        "Your summary should include:\n"
-        "1. A TL;DR (1-2 sentences)\n"
-        "2. Key Points (bulleted list)\n"
-        "3. Action Items (if any, as a bulleted list)\n"
-        "If the content is not useful or looks like an error page, say so.\n\n"
-        f"Content:\n{text}"
-    )
-    response = model.generate_content(prompt)
-    return response.text
-
-
 def fetch_confluence_page_content(page_id, base_url, email, api_token):
     api_url = f'{base_url}/wiki/rest/api/content/{page_id}?expand=body.storage'
     auth = (email, api_token)
@@ -115,6 +180,37 @@ def fetch_confluence_page_content(page_id, base_url, email, api_token):
     text = re.sub('<[^<]+?>', '', html)
     return text
 
+def fetch_confluence_page_version(page_id, base_url, email, api_token):
+    api_url = f'{base_url}/wiki/rest/api/content/{page_id}?expand=version'
+    auth = (email, api_token)
+    headers = {"Accept": "application/json"}
+    resp = requests.get(api_url, auth=auth, headers=headers)
+    if resp.status_code != 200:
+        raise Exception(f"Failed to fetch Confluence page version: {resp.text}")
+    return str(resp.json()["version"]["number"])
+
+def is_confluence_link(link):
+    return "atlassian.net/wiki" in link or "confluence" in link
+
+def fetch_link_content(link):
+    if "docs.google.com/document" in link:
+        return fetch_google_doc(link)
+    if is_confluence_link(link):
+        email = os.environ.get("ATLASSIAN_EMAIL")
+        api_token = os.environ.get("ATLASSIAN_API_TOKEN")
+        base_url_val, page_id = extract_baseurl_and_pageid(link, email, api_token)
+        return fetch_confluence_page_content(page_id, base_url_val, email, api_token)
+    raise ValueError("Unsupported link type for summarization.")
+
+def fetch_link_version(link):
+    # Cheap version check so unchanged pages are not re-fetched; None if unknown
+    if is_confluence_link(link):
+        email = os.environ.get("ATLASSIAN_EMAIL")
+        api_token = os.environ.get("ATLASSIAN_API_TOKEN")
+        base_url_val, page_id = extract_baseurl_and_pageid(link, email, api_token)
+        return fetch_confluence_page_version(page_id, base_url_val, email, api_token)
+    return None
+
 def extract_baseurl_and_pageid(url, email=None, api_token=None):
     # Always use static base URL for JumpCloud
     base_url = "https://jumpcloud.atlassian.net"
@@ -1,10 +1,22 @@
 import os
+import logging
 import yaml
 import re
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.context.say import Say
 from slack_bolt.workflows.step import WorkflowStep
-from app import summarize_text, fetch_google_doc, fetch_confluence_page_content, extract_baseurl_and_pageid
+from app import fetch_link_content, build_slack_app
+from summarizer import summarize_text, answer_question
+from model_scheduler import PRIORITY_INTERACTIVE
+from doc_index import DocIndex
+from preprocess import build_conversation
+from slack_client import RateLimitedClient, slack_limiter
+from recorder import EventRecorder, RECORD_EVENTS_PATH
 
 # Load Slack credentials from environment
 SLACK_BOT_TOKEN = os.environ.get("SLACK_BOT_TOKEN")
@@ -22,6 +34,26 @@ with open("channels.yaml", "r") as f:
 with open("errors.yaml", "r") as f:
     ERRORS = yaml.safe_load(f)["errors"]
 
+# Reverse index: channel ID -> teams mapped to it ("common" is not a team)
+def build_channel_team_index(channel_map):
+    index = {}
+    for team, channel_ids in channel_map.items():
+        if team == "common":
+            continue
+        for ch_id in channel_ids or []:
+            index.setdefault(ch_id, []).append(team)
+    return index
+
+CHANNEL_TEAMS = build_channel_team_index(CHANNEL_MAP)
+
+def save_channel_map(channels_map):
+    with open("channels.yaml", "w") as f:
+        yaml.safe_dump(channels_map, f)
+    CHANNEL_MAP.clear()
+    CHANNEL_MAP.update(channels_map)
+    CHANNEL_TEAMS.clear()
+    CHANNEL_TEAMS.update(build_channel_team_index(channels_map))
+
 #load online resources
 with open("resources.yaml", "r") as f:
     yaml_data = yaml.safe_load(f)
@@ -31,11 +63,45 @@ with open("resources.yaml", "r") as f:
 with open("teams.yaml", "r") as f:
     TEAM_DATA = yaml.safe_load(f)
 
-app = App(token=SLACK_BOT_TOKEN)
+app = build_slack_app()
+
+# Opt-in capture of incoming payloads for offline replay (see replay.py)
+if RECORD_EVENTS_PATH:
+    event_recorder = EventRecorder(RECORD_EVENTS_PATH)
+
+    @app.middleware
+    def record_events(body, next):
+        try:
+            event_recorder.record(body)
+        except Exception as e:
+            print(f"Failed to record event: {e}")
+        next()
+
+# Route every handler's Web API calls through the shared rate limiter. Bolt
+# has already built (and cached) say() on the raw client by the time this
+# runs, so it is rebuilt on the wrapped one too.
+@app.middleware
+def use_rate_limited_client(context, next):
+    client = RateLimitedClient(context.client, slack_limiter)
+    context["client"] = client
+    context["say"] = Say(client=client, channel=context.channel_id)
+    next()
 
 # Store user state in memory (for demo; use a DB for production)
 user_state = {}
 
+# Local retrieval index over the teams.yaml docs, used to answer DM questions
+doc_index = DocIndex()
+DOC_INDEX_REFRESH_SECONDS = int(os.environ.get("DOC_INDEX_REFRESH_SECONDS", "3600"))
+
+def refresh_doc_index_forever():
+    while True:
+        try:
+            doc_index.refresh()
+        except Exception as e:
+            print(f"Failed to refresh doc index: {e}")
+        time.sleep(DOC_INDEX_REFRESH_SECONDS)
+
 def get_team_checklist(team_name):
     team = TEAM_DATA.get(team_name)
     if team and isinstance(team, list):
@@ -59,12 +125,195 @@ def get_dm_channel_id(client, user_id):
     response = client.conversations_open(users=user_id)
     return response["channel"]["id"]
 
+def fetch_channel_members(client, channel_id):
+    members = []
+    cursor = None
+    while True:
+        result = client.conversations_members(channel=channel_id, limit=1000, cursor=cursor)
+        members.extend(result["members"])
+        cursor = result.get("response_metadata", {}).get("next_cursor")
+        if not cursor:
+            break
+    return members
+
+# Cached channel memberships so invites skip channels the user is already in
+CHANNEL_MEMBERS_TTL = 300
+INVITE_WORKERS = 4
+channel_members_cache = {}
+channel_members_lock = threading.Lock()
+
+def get_cached_channel_members(client, channel_id):
+    with channel_members_lock:
+        cached = channel_members_cache.get(channel_id)
+    if cached and time.time() - cached[0] < CHANNEL_MEMBERS_TTL:
+        return cached[1]
+    members = set(fetch_channel_members(client, channel_id))
+    with channel_members_lock:
+        channel_members_cache[channel_id] = (time.time(), members)
+    return members
+
+def invite_to_channel(client, user_id, channel_id):
+    # Returns "invited", "member" or raises
+    try:
+        if user_id in get_cached_channel_members(client, channel_id):
+            return "member"
+    except Exception:
+        pass  # The bot may not be able to list members; just try the invite
+    try:
+        client.conversations_invite(channel=channel_id, users=user_id)
+    except Exception as e:
+        if getattr(e, "response", None) is not None and e.response.get("error") == "already_in_channel":
+            return "member"
+        raise
+    with channel_members_lock:
+        if channel_id in channel_members_cache:
+            channel_members_cache[channel_id][1].add(user_id)
+    return "invited"
+
+def invite_to_channels(client, user_id, channel_ids, logger):
+    # Invites run in parallel; the rate-limited client keeps them within the tier budget
+    invited, failed = [], []
+    if not channel_ids:
+        return invited, failed
+    with ThreadPoolExecutor(max_workers=min(INVITE_WORKERS, len(channel_ids))) as executor:
+        futures = {executor.submit(invite_to_channel, client, user_id, ch_id): ch_id for ch_id in channel_ids}
+        for future in as_completed(futures):
+            ch_id = futures[future]
+            try:
+                if future.result() == "invited":
+                    invited.append(ch_id)
+            except Exception as e:
+                logger.warning(f"Failed to invite {user_id} to {ch_id}: {e}")
+                failed.append(ch_id)
+    return sorted(invited), sorted(failed)
+
+def build_user_team_index(client, logger):
+    # One paged conversations_members scan per mapped channel gives user ID -> teams
+    user_teams = {}
+    for ch_id, teams in CHANNEL_TEAMS.items():
+        try:
+            members = fetch_channel_members(client, ch_id)
+        except Exception as e:
+            logger.warning(f"Failed to fetch members of {ch_id}: {e}")
+            continue
+        with channel_members_lock:
+            channel_members_cache[ch_id] = (time.time(), set(members))
+        for member_id in members:
+            member_teams = user_teams.setdefault(member_id, [])
+            member_teams.extend(t for t in teams if t not in member_teams)
+    return user_teams
+
+def build_canvas_blocks(team_name, checklist):
+    canvas_blocks = [
+        {"type": "header", "text": {"type": "plain_text", "text": f"📝 {team_name} Onboarding Canvas"}},
+        {"type": "divider"},
+        {"type": "section", "text": {"type": "mrkdwn", "text": f"Welcome! Here is your onboarding checklist for the first week. Mark each as you complete it."}},
+        {"type": "divider"}
+    ]
+    for idx, item in enumerate(checklist):
+        canvas_blocks.append({
+            "type": "section",
+            "text": {"type": "mrkdwn", "text": f":white_large_square: {item}"},
+            "accessory": {
+                "type": "button",
+                "text": {"type": "plain_text", "text": "Mark as done"},
+                "action_id": f"canvas_checklist_done_{idx}",
+                "value": str(idx)
+            }
+        })
+    return canvas_blocks
+
+DURATION_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+SLACK_TS_PATTERN = re.compile(r"^\d{9,}(?:\.\d+)?$")
+
+def parse_time_point(value):
+    # "2h" (ago), a Slack ts, or an ISO date/datetime -> Slack ts string
+    match = DURATION_PATTERN.match(value)
+    if match:
+        return f"{time.time() - float(match.group(1)) * DURATION_UNITS[match.group(2)]:.6f}"
+    if SLACK_TS_PATTERN.match(value):
+        return value
+    try:
+        return f"{datetime.fromisoformat(value).timestamp():.6f}"
+    except ValueError:
+        raise ValueError(f"Couldn't understand the time '{value}'. Use e.g. 2h, 3d, 2026-10-01 or a message ts.")
+
+def parse_time_window(args):
+    # Pulls since:/until:/between: arguments out of a command's args
+    oldest = latest = None
+    remaining = []
+    for arg in args:
+        key, _, value = arg.partition(":")
+        if key not in ("since", "until", "between"):
+            remaining.append(arg)
+        elif not value:
+            raise ValueError(f"'{arg}' needs a time, e.g. {key}:2h.")
+        elif key == "since":
+            oldest = parse_time_point(value)
+        elif key == "until":
+            latest = parse_time_point(value)
+        else:
+            start, _, end = value.partition(",")
+            if not start or not end:
+                raise ValueError(f"'{arg}' needs two times separated by a comma, e.g. between:2026-10-01,2026-10-02.")
+            oldest, latest = sorted((parse_time_point(start), parse_time_point(end)), key=float)
+    return oldest, latest, remaining
+
 def search_error_patterns(error_text):
     for entry in ERRORS:
         if entry["pattern"].lower() in error_text.lower():
             return entry["resolution"]
     return None
 
+# Batch summarization: links are fetched in parallel; the model scheduler
+# caps how many Gemini calls run at the same time
+LINK_FETCH_WORKERS = 8
+
+# Slack wraps links as <url> or <url|label>
+LINK_PATTERN = re.compile(r"https?://[^\s<>|]+")
+PAGE_ID_PATTERNS = [
+    re.compile(r"/pages/(\d+)"),
+    re.compile(r"/pages/.+?pageId=(\d+)"),
+    re.compile(r"/(\d+)"),
+]
+DONE_PATTERN = re.compile(r"\bdone\b")
+YES_PATTERN = re.compile(r"\byes\b")
+
+def extract_links(text):
+    return LINK_PATTERN.findall(text)
+
+def extract_page_id(url):
+    for pattern in PAGE_ID_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            return match.group(1)
+    return None
+
+def build_link_index(links):
+    # page ID -> link, so a pasted link is matched with one dict lookup
+    index = {}
+    for l in links:
+        page_id = extract_page_id(l)
+        if page_id and page_id not in index:
+            index[page_id] = l
+    return index
+
+def summarize_link(link):
+    content = fetch_link_content(link)
+    return summarize_text(content[:8000], priority=PRIORITY_INTERACTIVE)
+
+def summarize_links(links, say):
+    # Post each summary as soon as it is ready instead of waiting for the whole batch
+    with ThreadPoolExecutor(max_workers=min(LINK_FETCH_WORKERS, len(links))) as executor:
+        futures = {executor.submit(summarize_link, link): link for link in links}
+        for future in as_completed(futures):
+            link = futures[future]
+            try:
+                say(f"Here is the summary for <{link}>:\n```{future.result()}```")
+            except Exception as e:
+                say(f"Error summarizing <{link}>: {e}")
+
 def format_links_with_priority(links):
     # links: list of dicts with 'url' and 'priority'
     sorted_links = sorted(links, key=lambda l: l.get('priority', 99))
@@ -99,7 +348,7 @@ def handle_new_joiner_yes(ack, body, client):
              }}
         ]
     )
-    user_state[user_id] = {"awaiting_team_dropdown": True}
+    user_state[user_id] = {"step": "awaiting_team_dropdown"}
 
 @app.action("new_joiner_no")
 def handle_new_joiner_no(ack, body, client):
@@ -117,7 +366,7 @@ def handle_new_joiner_no(ack, body, client):
             ]}
         ]
     )
-    user_state[user_id] = {"awaiting_doubt": True}
+    user_state[user_id] = {"step": "awaiting_doubt"}
 
 @app.action("has_doubt_yes")
 def handle_has_doubt_yes(ack, body, client):
@@ -128,7 +377,7 @@ def handle_has_doubt_yes(ack, body, client):
         channel=dm_channel,
         text="Please describe your error or paste the error message."
     )
-    user_state[user_id] = {"awaiting_error": True}
+    user_state[user_id] = {"step": "awaiting_error"}
 
 @app.action("has_doubt_no")
 def handle_has_doubt_no(ack, body, client):
@@ -142,7 +391,7 @@ def handle_has_doubt_no(ack, body, client):
     user_state.pop(user_id, None)
 
 @app.action("select_teams")
-def handle_select_teams(ack, body, client):
+def handle_select_teams(ack, body, client, logger):
     ack()
     user_id = body["user"]["id"]
     selected_teams = [opt["value"] for opt in body["actions"][0]["selected_options"]]
@@ -157,137 +406,116 @@ def handle_select_teams(ack, body, client):
         all_channels.update(team_channels)
     common_channels = CHANNEL_MAP.get("common", [])
     all_channels.update(common_channels)
-    invited_channels = []
-    for ch_id in all_channels:
-        try:
-            client.conversations_invite(channel=ch_id, users=user_id)
-            invited_channels.append(f"<#{ch_id}>")
-        except Exception as e:
-            print(f"Failed to invite to {ch_id}: {e}")
-    if invited_channels:
-        dm_channel = get_dm_channel_id(client, user_id)
-        client.chat_postMessage(
-            channel=dm_channel,
-            text=f"You have been added to these channels: {', '.join(invited_channels)}"
-        )
-    # Format links with priority
+    # Reply with the links right away; invites finish afterwards
     links_str = format_links_with_priority(all_links)
     dm_channel = get_dm_channel_id(client, user_id)
     client.chat_postMessage(
         channel=dm_channel,
-        text=f"Here are the links for your selected team(s):\n{links_str}\n\nIf you want a summary of any link, reply with the link. Otherwise, say 'done'."
+        text=f"Here are the links for your selected team(s):\n{links_str}\n\nIf you want a summary of any links, reply with one or more of them, or say 'all'. Otherwise, say 'done'."
     )
-    user_state[user_id] = {"teams": selected_teams, "links": [l['url'] for l in all_links if isinstance(l, dict) and 'url' in l], "awaiting_summarize": True}
+    links = [l['url'] for l in all_links if isinstance(l, dict) and 'url' in l]
+    user_state[user_id] = {"step": "awaiting_summarize", "teams": selected_teams, "links": links, "link_index": build_link_index(links)}
+    invited, failed = invite_to_channels(client, user_id, all_channels, logger)
+    lines = []
+    if invited:
+        lines.append(f"You have been added to these channels: {', '.join(f'<#{ch_id}>' for ch_id in invited)}")
+    if failed:
+        lines.append(f"I couldn't add you to: {', '.join(f'<#{ch_id}>' for ch_id in failed)}. Please ask a channel manager.")
+    if lines:
+        client.chat_postMessage(channel=dm_channel, text="\n".join(lines))
+
+# DM conversation state machine: user_state[user_id]["step"] selects the handler
+def ignore_message(user_id, text, state, event, say, client):
+    # Waiting on a button or dropdown, not on free text
+    return
+
+def handle_idle_message(user_id, text, state, event, say, client):
+    if event.get("channel_type") == "im" and text.strip().endswith("?") and len(doc_index):
+        # Questions outside a flow are answered from the top matching doc chunks
+        question = event.get("text", "")
+        try:
+            chunks = doc_index.search(question)
+            answer = answer_question(question, [c["text"] for c in chunks])
+            sources = ", ".join(f"<{url}>" for url in dict.fromkeys(c["url"] for c in chunks))
+            say(f"{answer}\n_Sources: {sources}_")
+        except Exception as e:
+            say(f"Error answering your question: {e}")
+        return
+    # If not in a flow, send the initial message
+    client.chat_postMessage(
+        channel=user_id,
+        text="This channel is for getting info related to your team or resolving errors you are facing and if you want to summarize a channel, use /summarize_channel. What do you need help with?",
+        blocks=[
+            {"type": "section", "text": {"type": "mrkdwn", "text": "This channel is for getting info related to your *team* or resolving *errors* you are facing. What do you need help with?"}},
+            {"type": "actions", "elements": [
+                {"type": "button", "text": {"type": "plain_text", "text": "Team Info"}, "value": "info_team", "action_id": "info_team"},
+                {"type": "button", "text": {"type": "plain_text", "text": "Error Help"}, "value": "info_error", "action_id": "info_error"}
+            ]}
+        ]
+    )
+    user_state[user_id] = {"step": "awaiting_info_or_error"}
 
-@app.event("app_mention")
-@app.event("message")
-def handle_message_events(body, say, event, context, client):
-    user_id = event.get("user")
-    text = event.get("text", "").lower()
-    channel = event.get("channel")
+def handle_error_message(user_id, text, state, event, say, client):
+    resolution = search_error_patterns(text.strip())
+    if resolution:
+        say(f"Here is a possible resolution for your error:\n*{resolution}*")
+    else:
+        say("Sorry, I couldn't find a resolution for your error. Please contact support or provide more details.")
+    user_state.pop(user_id, None)
 
-    # If user is in the middle of a flow, handle it and return
-    state = user_state.get(user_id, {})
-    if state.get("awaiting_team"):
-        # This block is now handled by the dropdown, so skip
+def handle_summarize_message(user_id, text, state, event, say, client):
+    if DONE_PATTERN.search(text):
+        say("Okay, let me know if you need anything else!")
+        user_state.pop(user_id, None)
         return
-    if state.get("awaiting_team_dropdown"):
-        # This block is now handled by the dropdown, so skip
+    if text.strip() == "all":
+        matched = list(state["links"])
+    else:
+        matched = []
+        for link in extract_links(text):
+            l = state["link_index"].get(extract_page_id(link))
+            if l and l not in matched:
+                matched.append(l)
+    if not matched:
+        say("Please reply with one or more of the links I provided (or their base URLs), 'all', or 'done'.")
         return
-    if state.get("awaiting_new_joiner") or state.get("awaiting_summarize") or state.get("awaiting_error") or state.get("awaiting_doubt") or state.get("awaiting_info_or_error"):
-        # Let the rest of the function handle the flow as before
-        # (the rest of your flow logic is already below)
-        pass
+    if len(matched) > 1:
+        say(f"Summarizing {len(matched)} links, I'll post each summary as soon as it's ready...")
+    summarize_links(matched, say)
+    # Prompt for another link or done
+    say("You can paste more links to summarize, say 'all', or reply 'done' if finished.")
+
+def handle_doubt_message(user_id, text, state, event, say, client):
+    if YES_PATTERN.search(text):
+        client.chat_postMessage(
+            channel=user_id,
+            text="Please describe your error or paste the error message."
+        )
+        user_state[user_id] = {"step": "awaiting_error"}
     else:
-        # If not in a flow, send the initial message
         client.chat_postMessage(
             channel=user_id,
-            text="This channel is for getting info related to your team or resolving errors you are facing and if you want to summarize a channel, use /summarize_channel. What do you need help with?",
-            blocks=[
-                {"type": "section", "text": {"type": "mrkdwn", "text": "This channel is for getting info related to your *team* or resolving *errors* you are facing. What do you need help with?"}},
-                {"type": "actions", "elements": [
-                    {"type": "button", "text": {"type": "plain_text", "text": "Team Info"}, "value": "info_team", "action_id": "info_team"},
-                    {"type": "button", "text": {"type": "plain_text", "text": "Error Help"}, "value": "info_error", "action_id": "info_error"}
-                ]}
-            ]
+            text="Okay! Let me know if you need anything else."
         )
-        user_state[user_id] = {"awaiting_info_or_error": True}
-        return
-
-    # Existing flow logic below (summarization, error, etc.)
-    if state.get("awaiting_error"):
-        error_text = text.strip()
-        resolution = search_error_patterns(error_text)
-        if resolution:
-            say(f"Here is a possible resolution for your error:\n*{resolution}*")
-        else:
-            say("Sorry, I couldn't find a resolution for your error. Please contact support or provide more details.")
         user_state.pop(user_id, None)
-        return
 
-    if state.get("awaiting_summarize"):
-        if "done" in text:
-            say("Okay, let me know if you need anything else!")
-            user_state.pop(user_id, None)
-            return
-        # Clean up the link (remove < > and whitespace, and anything before https)
-        link = text.strip().replace("<", "").replace(">", "")
-        link = re.sub(r"^[^h]*https", "https", link)  # Remove anything before 'https'
-        def base_url(l):
-            return re.sub(r'[?#].*$', '', l.strip().replace("<", "").replace(">", ""))
-        def extract_page_id(url):
-            match = re.search(r"/pages/(\d+)", url)
-            if match:
-                return match.group(1)
-            match = re.search(r"/pages/.+?pageId=(\d+)", url)
-            if match:
-                return match.group(1)
-            match = re.search(r"/(\d+)", url)
-            if match:
-                return match.group(1)
-            return None
-        matched = None
-        for l in state["links"]:
-            if extract_page_id(link) and extract_page_id(link) == extract_page_id(l):
-                matched = l
-                break
-        if not matched:
-            say("Please reply with one of the links I provided (or its base URL), or say 'done'.")
-            return
-        try:
-            if "docs.google.com/document" in link:
-                content = fetch_google_doc(link)
-            elif "atlassian.net/wiki" in link or "confluence" in link:
-                email = os.environ.get("ATLASSIAN_EMAIL")
-                api_token = os.environ.get("ATLASSIAN_API_TOKEN")
-                base_url_val, page_id = extract_baseurl_and_pageid(link, email, api_token)
-                content = fetch_confluence_page_content(page_id, base_url_val, email, api_token)
-            else:
-                say("Unsupported link type for summarization.")
-                return
-            summary = summarize_text(content[:8000])
-            say(f"Here is the summary for <{link}>:\n```{summary}```")
-            # Prompt for another link or done
-            say("You can paste another link to summarize, or reply 'done' if finished.")
-        except Exception as e:
-            say(f"Error summarizing the link: {e}")
-        return
+MESSAGE_HANDLERS = {
+    None: handle_idle_message,
+    "awaiting_team_dropdown": ignore_message,
+    "awaiting_new_joiner": ignore_message,
+    "awaiting_info_or_error": ignore_message,
+    "awaiting_doubt": handle_doubt_message,
+    "awaiting_error": handle_error_message,
+    "awaiting_summarize": handle_summarize_message,
+}
 
-    if state.get("awaiting_doubt"):
-        if "yes" in text:
-            client.chat_postMessage(
-                channel=user_id,
-                text="Please describe your error or paste the error message."
-            )
-            user_state[user_id] = {"awaiting_error": True}
-            return
-        else:
-            client.chat_postMessage(
-                channel=user_id,
-                text="Okay! Let me know if you need anything else."
-            )
-            user_state.pop(user_id, None)
-            return
+@app.event("app_mention")
+@app.event("message")
+def handle_message_events(body, say, event, context, client):
+    user_id = event.get("user")
+    state = user_state.get(user_id, {})
+    handler = MESSAGE_HANDLERS.get(state.get("step"), handle_idle_message)
+    handler(user_id, event.get("text", "").lower(), state, event, say, client)
 
 @app.action("info_team")
 def handle_info_team(ack, body, client):
@@ -311,7 +539,7 @@ def handle_info_team(ack, body, client):
              }}
         ]
     )
-    user_state[user_id] = {"awaiting_team_dropdown": True}
+    user_state[user_id] = {"step": "awaiting_team_dropdown"}
 
 @app.action("info_error")
 def handle_info_error(ack, body, client):
@@ -329,7 +557,7 @@ def handle_info_error(ack, body, client):
             ]}
         ]
     )
-    user_state[user_id] = {"awaiting_doubt": True}
+    user_state[user_id] = {"step": "awaiting_doubt"}
 
 @app.command("/summarize_channel")
 def handle_summarize_channel(ack, body, client, respond, context):
@@ -337,51 +565,64 @@ def handle_summarize_channel(ack, body, client, respond, context):
     channel_id = body["channel_id"]
     print("Channel ID used in conversations_history:", channel_id)
     user_id = body["user_id"]
-    text = body.get("text", "").strip()
+    args = body.get("text", "").split()
+    # "fast" skips Gemini and uses the local extractive summarizer
+    summary_mode = "extractive" if "fast" in args else None
+    args = [a for a in args if a != "fast"]
+    # since:2h, since:2026-10-01, until:..., between:ts1,ts2 limit the channel summary to a window
+    try:
+        oldest, latest, args = parse_time_window(args)
+    except ValueError as e:
+        respond(str(e))
+        return
+    window = {k: v for k, v in (("oldest", oldest), ("latest", latest)) if v}
+    if window and args:
+        respond("Time windows only apply to channel summaries; give either a thread ts or since:/until:/between:, not both.")
+        return
     thread_ts = None
     # 1. If user provides a thread_ts argument, use it
-    if text:
-        thread_ts = text.split()[0]
-    # 2. Otherwise, try to get thread_ts from context (if used as a reply in a thread)
-    if not thread_ts:
+    if args:
+        thread_ts = args[0]
+    # 2. Otherwise, try to get thread_ts from context (if used as a reply in a thread);
+    # a time window always means a channel summary
+    if not thread_ts and not window:
         message = body.get("message") or body.get("container", {})
         thread_ts = message.get("thread_ts") or message.get("ts")
     if thread_ts and thread_ts != body.get("trigger_id"):  # If we have a thread_ts, summarize the thread
         result = client.conversations_replies(channel=channel_id, ts=thread_ts, limit=1000)
         messages = result.get("messages", [])
-        conversation = "\n".join(
-            m.get("text", "") for m in messages if m.get("text") and not m.get("subtype")
-        )
+        conversation = build_conversation(messages, client)
         if not conversation.strip():
             respond("No messages to summarize in this thread.")
             return
-        summary = summarize_text(conversation[:8000])
+        summary = summarize_text(conversation, mode=summary_mode)
         respond(f"*Thread Summary:*\n{summary}")
         return
-    # Otherwise, summarize the channel
+    # Otherwise, summarize the channel; Slack applies the time window server-side
     messages = []
     cursor = None
     while len(messages) < 1000:
         result = client.conversations_history(
             channel=channel_id,
             limit=min(200, 1000 - len(messages)),
-            cursor=cursor
+            cursor=cursor,
+            inclusive=bool(window),
+            **window
         )
         messages.extend(result["messages"])
         cursor = result.get("response_metadata", {}).get("next_cursor")
-        if not cursor:
+        # Stop as soon as the window has no more messages
+        if not cursor or not result.get("has_more"):
             break
-    conversation = "\n".join(
-        m.get("text", "") for m in reversed(messages) if m.get("text") and not m.get("subtype")
-    )
+    conversation = build_conversation(reversed(messages), client)
     if not conversation.strip():
-        respond("No messages to summarize.")
+        respond("No messages to summarize in this time window." if window else "No messages to summarize.")
         return
-    summary = summarize_text(conversation[:8000])
+    summary = summarize_text(conversation, mode=summary_mode)
     respond(f"*Channel Summary:*{summary}")
 
     # Suggest contextual resources
-    suggestions = suggest_resources(conversation[:8000], RESOURCES)
+    suggestions = suggest_resources(conversation, RESOURCES)
     print("Suggestions from suggest_resources:", suggestions)
     if suggestions:
         respond("*📚 Helpful Resources Based on the Summary:*")
@@ -411,7 +652,7 @@ def handle_member_joined_channel(event, client, logger):
                 ]}
             ]
         )
-        user_state[user_id] = {"awaiting_new_joiner": True}
+        user_state[user_id] = {"step": "awaiting_new_joiner"}
     except Exception as e:
         logger.error(f"Failed to DM user {user_id}: {e}")
 
@@ -434,8 +675,7 @@ def handle_channel_created(event, client, logger):
                 updated = True
                 logger.info(f"Added channel {channel_id} to team: {team}")
     if updated:
-        with open("channels.yaml", "w") as f:
-            yaml.safe_dump(channels_map, f)
+        save_channel_map(channels_map)
 
 @app.shortcut("summarize_thread_action")
 def handle_summarize_thread_action(ack, shortcut, client, respond):
@@ -448,14 +688,12 @@ def handle_summarize_thread_action(ack, shortcut, client, respond):
     result = client.conversations_replies(channel=channel_id, ts=thread_ts, limit=1000)
     messages = result.get("messages", [])
     # Concatenate text, skipping bot messages and empty text
-    conversation = "\n".join(
-        m.get("text", "") for m in messages if m.get("text") and not m.get("subtype")
-    )
+    conversation = build_conversation(messages, client)
     if not conversation.strip():
         respond("No messages to summarize in this thread.")
         return
     # Summarize using Gemini
-    summary = summarize_text(conversation[:8000])  # Limit to 8k chars for Gemini
+    summary = summarize_text(conversation)  # build_conversation limits to 8k chars for Gemini
     respond(f"*Thread Summary:*\n{summary}")
 
     # Suggest contextual resources
@@ -506,8 +744,7 @@ def handle_sync_channels_button(ack, body, client, logger, respond):
                     updated = True
                     logger.info(f"Added channel {channel_id} to team: {team}")
     if updated:
-        with open("channels.yaml", "w") as f:
-            yaml.safe_dump(channels_map, f)
+        save_channel_map(channels_map)
         respond("Channel-to-team sync complete! Updated channels.yaml.")
     else:
         respond("Channel-to-team sync complete! No updates needed.")
@@ -535,8 +772,7 @@ def handle_channel_deleted(event, logger):
             updated = True
             logger.info(f"Removed deleted channel {channel_id} from team: {team}")
     if updated:
-        with open("channels.yaml", "w") as f:
-            yaml.safe_dump(channels_map, f)
+        save_channel_map(channels_map)
 
 @app.command("/send_onboarding_checklist")
 def send_onboarding_checklist_cmd(ack, body, client, respond):
@@ -555,39 +791,31 @@ def send_onboarding_checklist_cmd(ack, body, client, respond):
     respond("Checklist trigger button sent to channel.")
 
 @app.action("send_canvas_checklist")
-def handle_send_canvas_checklist(ack, body, client):
+def handle_send_canvas_checklist(ack, body, client, logger):
     ack()
     channel_id = body["actions"][0]["value"]
+    # The team scan caches every mapped channel's members, so a mapped target
+    # channel is read from the cache instead of being paged a second time
+    user_teams = build_user_team_index(client, logger)
     members = []
     try:
-        result = client.conversations_members(channel=channel_id)
-        members = result["members"]
+        members = sorted(get_cached_channel_members(client, channel_id))
     except Exception as e:
         client.chat_postMessage(channel=channel_id, text=f"Failed to fetch members: {e}")
         return
-    # For demo, ask for team name or use a default (could be improved to map users to teams)
-    team_name = "Hydrogen"  # TODO: Replace with logic to determine user's team
-    checklist = get_team_checklist(team_name) or DEFAULT_CHECKLIST
+    channel_teams = CHANNEL_TEAMS.get(channel_id, [])
+    # Checklist and blocks are built once per team, not once per member
+    canvases = {}
     for user_id in members:
         if user_id.startswith("U"):
+            teams = user_teams.get(user_id, [])
+            # Prefer the team this channel belongs to when the user is in several
+            team_name = next((t for t in teams if t in channel_teams), teams[0] if teams else "Onboarding")
+            if team_name not in canvases:
+                checklist = get_team_checklist(team_name) or DEFAULT_CHECKLIST
+                canvases[team_name] = (checklist, build_canvas_blocks(team_name, checklist))
+            checklist, canvas_blocks = canvases[team_name]
             dm_channel = get_dm_channel_id(client, user_id)
-            canvas_blocks = [
-                {"type": "header", "text": {"type": "plain_text", "text": f"📝 {team_name} Onboarding Canvas"}},
-                {"type": "divider"},
-                {"type": "section", "text": {"type": "mrkdwn", "text": f"Welcome! Here is your onboarding checklist for the first week. Mark each as you complete it."}},
-                {"type": "divider"}
-            ]
-            for idx, item in enumerate(checklist):
-                canvas_blocks.append({
-                    "type": "section",
-                    "text": {"type": "mrkdwn", "text": f":white_large_square: {item}"},
-                    "accessory": {
-                        "type": "button",
-                        "text": {"type": "plain_text", "text": "Mark as done"},
-                        "action_id": f"canvas_checklist_done_{idx}",
-                        "value": str(idx)
-                    }
-                })
             client.chat_postMessage(
                 channel=dm_channel,
                 blocks=canvas_blocks,
@@ -652,5 +880,7 @@ def suggest_resources(summary: str, resources_data: dict) -> list:
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    threading.Thread(target=refresh_doc_index_forever, daemon=True).start()
     handler = SocketModeHandler(app, SLACK_APP_TOKEN)
     handler.start() 
\ No newline at end of file
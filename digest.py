@@ -0,0 +1,158 @@
+import os
+import logging
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import yaml
+from slack_sdk import WebClient
+from summarizer import summarize_text
+from model_scheduler import ModelScheduler, PRIORITY_BACKGROUND
+from preprocess import build_conversation
+from slack_client import RateLimitedClient, slack_limiter
+
+# Offline digest: summarize the activity of every channel in channels.yaml
+# since the last run and write (or post) one digest per team.
+# Run once with `python digest.py --once`, or leave `python digest.py` running
+# to generate the digest every day at DIGEST_TIME.
+
+DIGEST_STATE_PATH = os.environ.get("DIGEST_STATE_PATH", "digest_state.json")
+DIGEST_DIR = os.environ.get("DIGEST_DIR", "digests")
+DIGEST_TIME = os.environ.get("DIGEST_TIME", "07:00")
+DIGEST_CHANNEL_ID = os.environ.get("DIGEST_CHANNEL_ID")
+DIGEST_WORKERS = 8
+# The digest runs in its own process with its own model scheduler, so these
+# limits are not shared with the bot's MODEL_* limits. Keep them small enough
+# that the bot and the digest together stay under the Gemini quota.
+DIGEST_MODEL_CONCURRENCY = int(os.environ.get("DIGEST_MODEL_CONCURRENCY", "2"))
+DIGEST_MODEL_TOKENS_PER_MINUTE = int(os.environ.get("DIGEST_MODEL_TOKENS_PER_MINUTE", "50000"))
+SLACK_API_URL = os.environ.get("SLACK_API_URL", WebClient.BASE_URL)
+# Digest requests only wait on the digest's own scheduler, behind the other
+# channels of the same run. Nobody is waiting on a nightly batch, so a channel
+# may queue for up to ten minutes under the small DIGEST_MODEL_* budget before
+# it falls back to the extractive summary.
+DIGEST_MODEL_DEADLINE_SECONDS = 600
+DEFAULT_LOOKBACK = timedelta(days=1)
+MAX_MESSAGES = 1000
+
+def load_digest_state():
+    if not os.path.exists(DIGEST_STATE_PATH):
+        return {}
+    with open(DIGEST_STATE_PATH, "r") as f:
+        return json.load(f)
+
+def save_digest_state(digest_state):
+    tmp_path = DIGEST_STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(digest_state, f, indent=2)
+    os.replace(tmp_path, DIGEST_STATE_PATH)
+
+def fetch_channel_activity(client, channel_id, oldest):
+    messages = []
+    cursor = None
+    while len(messages) < MAX_MESSAGES:
+        result = client.conversations_history(
+            channel=channel_id,
+            oldest=oldest,
+            limit=min(200, MAX_MESSAGES - len(messages)),
+            cursor=cursor
+        )
+        messages.extend(result["messages"])
+        cursor = result.get("response_metadata", {}).get("next_cursor")
+        if not cursor or not result.get("has_more"):
+            break
+    return messages
+
+def summarize_channel(client, scheduler, channel_id, oldest):
+    # Returns (newest message ts, summary); summary is None if nothing happened
+    messages = fetch_channel_activity(client, channel_id, oldest)
+    if not messages:
+        return oldest, None
+    latest = max(m["ts"] for m in messages)
+    conversation = build_conversation(reversed(messages), client)
+    if not conversation.strip():
+        return latest, None
+    summary = summarize_text(conversation, deadline=DIGEST_MODEL_DEADLINE_SECONDS, priority=PRIORITY_BACKGROUND,
+                             scheduler=scheduler)
+    return latest, summary
+
+def format_team_digest(team, channel_summaries, day):
+    lines = [f"*{team} digest for {day}*"]
+    for channel_id, summary in channel_summaries:
+        lines.append(f"\n<#{channel_id}>\n{summary}")
+    return "\n".join(lines)
+
+def run_digest(client, scheduler, post_channel=None, out_dir=DIGEST_DIR):
+    with open("channels.yaml", "r") as f:
+        channels_map = yaml.safe_load(f)
+    digest_state = load_digest_state()
+    default_oldest = str((datetime.now() - DEFAULT_LOOKBACK).timestamp())
+
+    # A channel mapped to several teams is only fetched and summarized once
+    channel_ids = sorted({ch_id for ch_ids in channels_map.values() for ch_id in ch_ids or []})
+    results = {}
+    with ThreadPoolExecutor(max_workers=DIGEST_WORKERS) as executor:
+        futures = {
+            ch_id: executor.submit(summarize_channel, client, scheduler, ch_id, digest_state.get(ch_id, default_oldest))
+            for ch_id in channel_ids
+        }
+        for ch_id, future in futures.items():
+            try:
+                results[ch_id] = future.result()
+            except Exception as e:
+                print(f"Failed to summarize {ch_id}: {e}")
+
+    day = datetime.now().strftime("%Y-%m-%d")
+    for team, ch_ids in channels_map.items():
+        channel_summaries = [(ch_id, results[ch_id][1]) for ch_id in ch_ids or [] if ch_id in results and results[ch_id][1]]
+        if not channel_summaries:
+            continue
+        digest = format_team_digest(team, channel_summaries, day)
+        if post_channel:
+            client.chat_postMessage(channel=post_channel, text=digest)
+        else:
+            team_dir = os.path.join(out_dir, day)
+            os.makedirs(team_dir, exist_ok=True)
+            with open(os.path.join(team_dir, f"{team}.md"), "w") as f:
+                f.write(digest + "\n")
+        print(f"Wrote digest for {team} ({len(channel_summaries)} channels)")
+
+    # Only advance channels that were summarized, so failures are retried next run
+    for ch_id, (latest, _) in results.items():
+        digest_state[ch_id] = latest
+    save_digest_state(digest_state)
+    print(f"Slack API calls: {slack_limiter.stats()}")
+    print(f"Model scheduler: {scheduler.stats()}")
+
+def seconds_until(run_at):
+    hour, minute = (int(part) for part in run_at.split(":"))
+    now = datetime.now()
+    next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate per-team channel digests from channels.yaml")
+    parser.add_argument("--once", action="store_true", help="generate one digest and exit")
+    parser.add_argument("--at", default=DIGEST_TIME, help="daily run time as HH:MM (default: %(default)s)")
+    parser.add_argument("--post-channel", default=DIGEST_CHANNEL_ID, help="post digests to this channel instead of writing files")
+    parser.add_argument("--out-dir", default=DIGEST_DIR, help="directory for digest files (default: %(default)s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    client = RateLimitedClient(WebClient(token=os.environ["SLACK_BOT_TOKEN"], base_url=SLACK_API_URL), slack_limiter)
+    scheduler = ModelScheduler(DIGEST_MODEL_CONCURRENCY, DIGEST_MODEL_TOKENS_PER_MINUTE)
+    if args.once:
+        run_digest(client, scheduler, args.post_channel, args.out_dir)
+        return
+    while True:
+        time.sleep(seconds_until(args.at))
+        try:
+            run_digest(client, scheduler, args.post_channel, args.out_dir)
+        except Exception as e:
+            print(f"Digest run failed: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import yaml
+import google.generativeai as genai
+from app import fetch_link_content, fetch_link_version
+from summarizer import run_model, estimate_tokens
+from model_scheduler import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+
+# Local retrieval index over the docs linked in teams.yaml.
+# Chunk vectors live in a memory-mapped .npy file next to a JSON file with the
+# chunk text and the version of every indexed page. Only pages whose version
+# changed are re-fetched and re-embedded on refresh.
+# Rebuild from the command line with `python doc_index.py`.
+
+DOC_INDEX_DIR = os.environ.get("DOC_INDEX_DIR", "doc_index")
+EMBEDDING_MODEL = "models/text-embedding-004"
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+EMBED_BATCH_SIZE = 50
+
+def load_team_links():
+    with open("teams.yaml", "r") as f:
+        teams = yaml.safe_load(f)
+    urls = []
+    for team_data in teams.values():
+        team_links = team_data.get("links", []) if isinstance(team_data, dict) else team_data
+        for l in team_links or []:
+            url = l["url"] if isinstance(l, dict) else l
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+def chunk_text(text, size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    text = " ".join(text.split())
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        # Prefer to cut at a sentence or word boundary
+        if end < len(text):
+            cut = max(text.rfind(". ", start, end), text.rfind(" ", start, end))
+            if cut > start + size // 2:
+                end = cut + 1
+        chunks.append(text[start:end].strip())
+        if end == len(text):
+            break
+        start = end - overlap
+    return [c for c in chunks if c]
+
+def embed_texts(texts, task_type, priority=PRIORITY_BACKGROUND):
+    vectors = []
+    for i in range(0, len(texts), EMBED_BATCH_SIZE):
+        batch = texts[i:i + EMBED_BATCH_SIZE]
+        result = run_model(genai.embed_content, model=EMBEDDING_MODEL, content=batch, task_type=task_type,
+                           priority=priority, tokens=estimate_tokens("".join(batch)))
+        vectors.extend(result["embedding"])
+    vectors = np.asarray(vectors, dtype=np.float32)
+    # Normalize so a dot product is the cosine similarity
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+class DocIndex:
+    def __init__(self, index_dir=DOC_INDEX_DIR):
+        self.vectors_path = os.path.join(index_dir, "vectors.npy")
+        self.meta_path = os.path.join(index_dir, "meta.json")
+        self.lock = threading.Lock()
+        self.vectors = None
+        self.meta = {"docs": {}, "chunks": []}
+        self.load()
+
+    def load(self):
+        if not (os.path.exists(self.vectors_path) and os.path.exists(self.meta_path)):
+            return
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        vectors = np.load(self.vectors_path, mmap_mode="r")
+        with self.lock:
+            self.meta, self.vectors = meta, vectors
+
+    def __len__(self):
+        return len(self.meta["chunks"])
+
+    def refresh(self, urls=None):
+        urls = urls if urls is not None else load_team_links()
+        with self.lock:
+            old_meta, old_vectors = self.meta, self.vectors
+        kept_rows = []
+        new_chunks = []
+        new_vectors = []
+        docs = {}
+        changed = False
+        for url in urls:
+            old_doc = old_meta["docs"].get(url)
+            try:
+                version = fetch_link_version(url)
+                content = None
+                if version is None or not old_doc or old_doc["version"] != version:
+                    content = fetch_link_content(url)
+                    # Pages without a version API are versioned by their content
+                    version = version or hashlib.sha1(content.encode("utf-8")).hexdigest()
+            except Exception as e:
+                print(f"Failed to refresh {url} in doc index: {e}")
+                if not old_doc:
+                    continue
+                version, content = old_doc["version"], None
+            if old_doc and old_doc["version"] == version:
+                kept_rows.append((url, version, range(old_doc["start"], old_doc["end"])))
+                continue
+            chunks = chunk_text(content)
+            if not chunks:
+                continue
+            new_chunks.append((url, version, chunks))
+            new_vectors.append(embed_texts(chunks, "retrieval_document"))
+            changed = True
+        if not changed and len(kept_rows) == len(old_meta["docs"]):
+            return False
+
+        # Write the compacted index to new files and swap them in atomically
+        dim = (new_vectors[0] if new_vectors else old_vectors).shape[1]
+        total = sum(len(rows) for _, _, rows in kept_rows) + sum(len(v) for v in new_vectors)
+        os.makedirs(os.path.dirname(self.vectors_path) or ".", exist_ok=True)
+        tmp_vectors_path = self.vectors_path + ".tmp.npy"
+        out = np.lib.format.open_memmap(tmp_vectors_path, mode="w+", dtype=np.float32, shape=(total, dim))
+        chunks_meta = []
+        row = 0
+        for url, version, rows in kept_rows:
+            out[row:row + len(rows)] = old_vectors[rows.start:rows.stop]
+            chunks_meta.extend(old_meta["chunks"][rows.start:rows.stop])
+            docs[url] = {"version": version, "start": row, "end": row + len(rows)}
+            row += len(rows)
+        for (url, version, chunks), vectors in zip(new_chunks, new_vectors):
+            out[row:row + len(chunks)] = vectors
+            chunks_meta.extend({"url": url, "text": c} for c in chunks)
+            docs[url] = {"version": version, "start": row, "end": row + len(chunks)}
+            row += len(chunks)
+        out.flush()
+        del out
+        tmp_meta_path = self.meta_path + ".tmp"
+        with open(tmp_meta_path, "w") as f:
+            json.dump({"docs": docs, "chunks": chunks_meta}, f)
+        os.replace(tmp_vectors_path, self.vectors_path)
+        os.replace(tmp_meta_path, self.meta_path)
+        self.load()
+        return True
+
+    def search(self, question, k=4):
+        with self.lock:
+            meta, vectors = self.meta, self.vectors
+        if vectors is None or not len(meta["chunks"]):
+            return []
+        query = embed_texts([question], "retrieval_query", PRIORITY_INTERACTIVE)[0]
+        scores = vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [dict(meta["chunks"][i], score=float(scores[i])) for i in top]
+
+if __name__ == "__main__":
+    index = DocIndex()
+    updated = index.refresh()
+    print(f"Doc index {'updated' if updated else 'already up to date'}: {len(index)} chunks")
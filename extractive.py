@@ -0,0 +1,93 @@
+import re
+import zlib
+import numpy as np
+
+# Local extractive summarizer used when Gemini is slow or unavailable.
+# Sentences are scored with TextRank over hashed TF-IDF vectors and the output
+# follows the same TL;DR / Key Points / Action Items layout as summarize_text.
+
+HASH_DIM = 1024
+MAX_SENTENCES = 1000
+KEY_POINTS = 5
+MAX_ACTION_ITEMS = 5
+DAMPING = 0.85
+ITERATIONS = 30
+
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+WORD_PATTERN = re.compile(r"[a-z0-9][a-z0-9_'-]+")
+ACTION_PATTERN = re.compile(
+    r"\b(todo|to do|action item|need to|needs to|should|must|please|will|let's|follow up|deadline|by (mon|tues|wednes|thurs|fri|satur|sun)day|by eod|assign(ed)? to)\b",
+    re.IGNORECASE
+)
+STOPWORDS = set("""
+a an the and or but if then so of to in on at by for with from as is are was were be been being it its
+this that these those i you he she we they me him her us them my your our their what which who whom
+do does did have has had not no yes can could would just also there here about into over than too very
+""".split())
+
+def split_sentences(text):
+    sentences = []
+    seen = set()
+    for s in SENTENCE_SPLIT_PATTERN.split(text):
+        s = " ".join(s.split()).lstrip("-*• ")
+        if len(s) >= 20 and s not in seen:
+            seen.add(s)
+            sentences.append(s)
+            if len(sentences) == MAX_SENTENCES:
+                break
+    return sentences
+
+def sentence_vectors(sentences):
+    # Hashed term counts keep this dictionary-free and fixed-size
+    rows, cols = [], []
+    for i, s in enumerate(sentences):
+        for word in WORD_PATTERN.findall(s.lower()):
+            if word not in STOPWORDS:
+                rows.append(i)
+                cols.append(zlib.crc32(word.encode("utf-8")) % HASH_DIM)
+    flat = np.asarray(rows, dtype=np.intp) * HASH_DIM + np.asarray(cols, dtype=np.intp)
+    counts = np.bincount(flat, minlength=len(sentences) * HASH_DIM).astype(np.float32).reshape(len(sentences), HASH_DIM)
+    df = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + df)) + 1
+    vectors = np.log1p(counts) * idf
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def textrank_scores(vectors):
+    # Power iteration over the cosine similarity graph without materializing
+    # the n x n matrix: S @ x is computed as V @ (V.T @ x) minus the diagonal
+    n = len(vectors)
+    diagonal = np.einsum("ij,ij->i", vectors, vectors)
+    row_sums = vectors @ vectors.sum(axis=0) - diagonal
+    inverse = np.divide(1.0, row_sums, out=np.zeros_like(row_sums), where=row_sums > 1e-9)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(ITERATIONS):
+        weighted = scores * inverse
+        updated = (1 - DAMPING) / n + DAMPING * (vectors @ (vectors.T @ weighted) - diagonal * weighted)
+        if np.abs(updated - scores).sum() < 1e-6:
+            return updated
+        scores = updated
+    return scores
+
+def extractive_summarize(text, key_points=KEY_POINTS):
+    sentences = split_sentences(text)
+    if not sentences:
+        return "TL;DR: Not enough content to summarize."
+    scores = textrank_scores(sentence_vectors(sentences))
+    ranked = np.argsort(-scores)
+    tldr = sentences[ranked[0]]
+    # Key points are shown in their original order so the summary still reads chronologically
+    points = sorted(ranked[1:key_points + 1])
+    actions = [i for i, s in enumerate(sentences) if ACTION_PATTERN.search(s)]
+    actions = [sentences[i] for i in sorted(actions, key=lambda i: -scores[i])[:MAX_ACTION_ITEMS]]
+
+    lines = [f"*TL;DR:* {tldr}", "", "*Key Points:*"]
+    lines.extend(f"• {sentences[i]}" for i in points)
+    if not points:
+        lines.append("• (none)")
+    lines.extend(["", "*Action Items:*"])
+    lines.extend(f"• {s}" for s in actions)
+    if not actions:
+        lines.append("• None identified")
+    lines.extend(["", "_(Quick extractive summary generated locally)_"])
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+# Governor for Gemini calls: a fixed number of workers caps concurrency, a
+# tokens-per-minute budget caps throughput, and queued requests are served by
+# priority lane (then earliest deadline). Requests whose deadline passes while
+# queued are dropped instead of being sent to the model.
+
+PRIORITY_INTERACTIVE = 0  # DM conversations
+PRIORITY_COMMAND = 1      # slash commands and shortcuts
+PRIORITY_BACKGROUND = 2   # digests and index pre-warming
+LANE_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_COMMAND: "command", PRIORITY_BACKGROUND: "background"}
+
+class TokenBudget:
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens):
+        # Takes the tokens and returns 0, or returns the seconds until they refill
+        tokens = min(tokens, self.capacity)
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+class ModelScheduler:
+    def __init__(self, max_concurrency, tokens_per_minute):
+        self.queue = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.budget = TokenBudget(tokens_per_minute)
+        self.metrics = {
+            lane: {"submitted": 0, "completed": 0, "failed": 0, "expired": 0, "cancelled": 0,
+                   "queue_time_total": 0.0, "queue_time_max": 0.0}
+            for lane in LANE_NAMES
+        }
+        for _ in range(max_concurrency):
+            threading.Thread(target=self.worker, daemon=True).start()
+
+    def submit(self, fn, *args, priority=PRIORITY_COMMAND, timeout=None, tokens=0, **kwargs):
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        item = (priority, deadline if deadline is not None else float("inf"), next(self.sequence),
+                time.monotonic(), deadline, tokens, future, fn, args, kwargs)
+        with self.condition:
+            self.metrics[priority]["submitted"] += 1
+            heapq.heappush(self.queue, item)
+            self.condition.notify()
+        return future
+
+    def count(self, priority, metric, value=1):
+        with self.condition:
+            self.metrics[priority][metric] += value
+
+    def claim(self):
+        # Called with the condition held. The budget is checked before an item
+        # is dequeued, so refilled tokens always go to whatever is at the head
+        # of the queue when they arrive, never to a request popped earlier.
+        while True:
+            if not self.queue:
+                self.condition.wait()
+                continue
+            priority, _, _, _, deadline, tokens, future, _, _, _ = self.queue[0]
+            now = time.monotonic()
+            if future.cancelled():
+                heapq.heappop(self.queue)
+                self.metrics[priority]["cancelled"] += 1
+                continue
+            wait = self.budget.reserve(tokens) if deadline is None or now <= deadline else None
+            if wait == 0:
+                return heapq.heappop(self.queue), True
+            if wait is None or (deadline is not None and now + wait > deadline):
+                self.metrics[priority]["expired"] += 1
+                return heapq.heappop(self.queue), False
+            self.condition.wait(wait)
+
+    def worker(self):
+        while True:
+            with self.condition:
+                item, admitted = self.claim()
+            priority, _, _, queued_at, deadline, tokens, future, fn, args, kwargs = item
+            if not admitted:
+                if future.set_running_or_notify_cancel():
+                    future.set_exception(TimeoutError("Model request expired before it could be sent"))
+                continue
+            if not future.set_running_or_notify_cancel():
+                self.count(priority, "cancelled")
+                continue
+            queue_time = time.monotonic() - queued_at
+            with self.condition:
+                lane = self.metrics[priority]
+                lane["queue_time_total"] += queue_time
+                lane["queue_time_max"] = max(lane["queue_time_max"], queue_time)
+            try:
+                future.set_result(fn(*args, **kwargs))
+                self.count(priority, "completed")
+            except Exception as e:
+                future.set_exception(e)
+                self.count(priority, "failed")
+
+    def stats(self):
+        with self.condition:
+            stats = {"queued": len(self.queue)}
+            for priority, lane in self.metrics.items():
+                started = lane["completed"] + lane["failed"]
+                stats[LANE_NAMES[priority]] = dict(
+                    lane, queue_time_avg=lane["queue_time_total"] / started if started else 0.0
+                )
+            return stats
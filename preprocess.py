@@ -0,0 +1,158 @@
+import re
+import time
+import logging
+import threading
+from urllib.parse import urlparse, unquote_plus
+
+# Streaming cleanup of Slack messages before they are summarized: resolves
+# mentions to names, shortens links to titles, drops join/leave and bot noise
+# and collapses duplicated lines, so more real conversation fits in the
+# 8000-character summary budget.
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_TTL = 3600
+# Message subtypes that still carry conversation; everything else is noise
+KEPT_SUBTYPES = {"thread_broadcast", "file_share", "me_message"}
+LOW_VALUE_PATTERN = re.compile(
+    r"^\s*(ok(ay)?|k|thanks?( you)?|thx|ty|\+1|lgtm|nice|cool|great|yes|no|done|(:[a-z0-9_+-]+:\s*)+)[.!]*\s*$",
+    re.IGNORECASE
+)
+MENTION_PATTERN = re.compile(r"<@([UW][A-Z0-9]+)(?:\|([^>]*))?>")
+CHANNEL_PATTERN = re.compile(r"<#(C[A-Z0-9]+)(?:\|([^>]*))?>")
+SPECIAL_MENTION_PATTERN = re.compile(r"<!(here|channel|everyone)(?:\|[^>]*)?>")
+SUBTEAM_PATTERN = re.compile(r"<!subteam\^[A-Z0-9]+(?:\|([^>]*))?>")
+LINK_PATTERN = re.compile(r"<((?:https?|mailto):[^|>]+)(?:\|([^>]+))?>")
+CONFLUENCE_TITLE_PATTERN = re.compile(r"/pages/\d+/([^/?#]+)")
+
+class UserDirectory:
+    # Cached user ID -> display name map, loaded with paged users_list calls
+    # and reloaded only when the TTL expires. Users missing from users_list
+    # (Slack Connect, deleted users) are looked up once with users_info and
+    # kept in a separate map that survives reloads.
+    def __init__(self, ttl=USER_CACHE_TTL):
+        self.ttl = ttl
+        self.names = {}
+        self.extra_names = {}
+        self.loaded_at = 0
+        self.lock = threading.Lock()
+
+    def load(self, client):
+        names = {}
+        cursor = None
+        while True:
+            result = client.users_list(limit=1000, cursor=cursor)
+            for member in result["members"]:
+                names[member["id"]] = display_name(member)
+            cursor = result.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+        self.names = names
+
+    def name(self, client, user_id):
+        with self.lock:
+            now = time.time()
+            if now - self.loaded_at > self.ttl:
+                # Set first so a failing users_list is not retried on every mention
+                self.loaded_at = now
+                try:
+                    self.load(client)
+                except Exception as e:
+                    logger.warning(f"Failed to load user directory: {e}")
+            if user_id in self.names:
+                return self.names[user_id]
+            cached = self.extra_names.get(user_id)
+            if cached and now - cached[0] <= self.ttl:
+                return cached[1]
+            try:
+                name = display_name(client.users_info(user=user_id)["user"])
+            except Exception:
+                name = user_id
+            self.extra_names[user_id] = (now, name)
+            return name
+
+def display_name(member):
+    profile = member.get("profile", {})
+    return profile.get("display_name") or profile.get("real_name") or member.get("real_name") or member.get("name") or member["id"]
+
+user_directory = UserDirectory()
+
+def link_title(url, label=None):
+    if label:
+        return label
+    if url.startswith("mailto:"):
+        return url[len("mailto:"):]
+    match = CONFLUENCE_TITLE_PATTERN.search(url)
+    if match:
+        return unquote_plus(match.group(1))
+    parsed = urlparse(url)
+    if "docs.google.com" in parsed.netloc:
+        return "Google Doc"
+    first_segment = parsed.path.strip("/").split("/")[0]
+    return f"{parsed.netloc}/{first_segment}" if first_segment else parsed.netloc
+
+def clean_text(text, client):
+    text = MENTION_PATTERN.sub(lambda m: "@" + (m.group(2) or user_directory.name(client, m.group(1))), text)
+    text = CHANNEL_PATTERN.sub(lambda m: "#" + (m.group(2) or m.group(1)), text)
+    text = SPECIAL_MENTION_PATTERN.sub(lambda m: "@" + m.group(1), text)
+    text = SUBTEAM_PATTERN.sub(lambda m: m.group(1) or "@group", text)
+    text = LINK_PATTERN.sub(lambda m: link_title(m.group(1), m.group(2)), text)
+    return " ".join(text.split())
+
+def new_stats():
+    return {"raw_messages": 0, "raw_chars": 0, "cleaned_messages": 0, "cleaned_chars": 0,
+            "dropped_noise": 0, "dropped_low_value": 0, "dropped_duplicates": 0,
+            "kept_messages": 0, "kept_chars": 0, "truncated": 0}
+
+def preprocess_messages(messages, client, stats=None):
+    # Yields cleaned message lines one by one; messages must be in chronological order
+    stats = stats if stats is not None else new_stats()
+    seen = set()
+    for m in messages:
+        raw = m.get("text", "")
+        stats["raw_messages"] += 1
+        stats["raw_chars"] += len(raw) + 1
+        if not raw or m.get("bot_id") or (m.get("subtype") and m["subtype"] not in KEPT_SUBTYPES):
+            stats["dropped_noise"] += 1
+            continue
+        text = clean_text(raw, client)
+        if not text or LOW_VALUE_PATTERN.match(text):
+            stats["dropped_low_value"] += 1
+            continue
+        key = text.lower()
+        if key in seen:
+            stats["dropped_duplicates"] += 1
+            continue
+        seen.add(key)
+        stats["cleaned_messages"] += 1
+        stats["cleaned_chars"] += len(text) + 1
+        yield text
+
+def format_stats(stats):
+    # The reduction only covers messages that were cleaned; messages past the
+    # size limit are reported on their own
+    saved = 1 - stats["cleaned_chars"] / stats["raw_chars"] if stats["raw_chars"] else 0
+    return (f"cleanup {stats['raw_messages']} -> {stats['cleaned_messages']} messages, "
+            f"{stats['raw_chars']} -> {stats['cleaned_chars']} chars ({saved:.0%} smaller); "
+            f"dropped {stats['dropped_noise']} noise, {stats['dropped_low_value']} low-value, "
+            f"{stats['dropped_duplicates']} duplicate; kept {stats['kept_messages']} messages "
+            f"({stats['kept_chars']} chars), {stats['truncated']} over the size limit")
+
+def build_conversation(messages, client, limit=8000):
+    # Stops cleaning messages once the summary budget is full; the rest are
+    # only counted as over the size limit
+    stats = new_stats()
+    messages = iter(messages)
+    lines = []
+    size = 0
+    for line in preprocess_messages(messages, client, stats):
+        if size + len(line) + 1 > limit:
+            stats["truncated"] += 1
+            break
+        lines.append(line)
+        size += len(line) + 1
+    stats["kept_messages"] = len(lines)
+    stats["kept_chars"] = size
+    stats["truncated"] += sum(1 for _ in messages)
+    logger.info(f"Preprocessed conversation: {format_stats(stats)}")
+    return "\n".join(lines)
@@ -0,0 +1,64 @@
+import os
+import re
+import json
+import time
+import threading
+
+# Opt-in capture of incoming Slack payloads (events, actions, commands and
+# shortcuts) as JSONL, with secrets and personal data redacted, so production
+# traffic can be replayed offline with replay.py.
+# Enable by setting RECORD_EVENTS_PATH.
+
+RECORD_EVENTS_PATH = os.environ.get("RECORD_EVENTS_PATH")
+REDACTED = "[redacted]"
+SECRET_KEYS = {"token", "bot_access_token", "access_token", "enterprise_token"}
+# Keys holding personal data, wherever they appear in a payload
+PII_KEYS = {
+    "email", "real_name", "real_name_normalized", "display_name", "display_name_normalized",
+    "first_name", "last_name", "phone", "skype", "username", "user_name",
+}
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_PATTERN = re.compile(r"(?<![\w.])\+?\d{1,3}[\s.-]?\(?\d{3}\)?[\s.-]\d{3}[\s.-]\d{4}(?![\w.])")
+
+def redact_text(text):
+    text = EMAIL_PATTERN.sub("[email]", text)
+    return PHONE_PATTERN.sub("[phone]", text)
+
+def redact(value, key=None):
+    if isinstance(value, dict):
+        # User objects also carry the user's name under "name"
+        is_user = str(value.get("id", "")).startswith(("U", "W"))
+        redacted = {}
+        for item_key, item in value.items():
+            if item_key in SECRET_KEYS or item_key in PII_KEYS or (is_user and item_key == "name"):
+                redacted[item_key] = REDACTED
+            elif item_key == "response_url":
+                # Kept so replays exercise respond(); the URL itself is a credential
+                redacted[item_key] = "https://hooks.slack.com/redacted"
+            else:
+                redacted[item_key] = redact(item, item_key)
+        return redacted
+    if isinstance(value, list):
+        return [redact(item, key) for item in value]
+    # Only free text is scrubbed; IDs and timestamps must survive for replay
+    if isinstance(value, str) and key == "text":
+        return redact_text(value)
+    return value
+
+def payload_kind(body):
+    if "command" in body:
+        return "command"
+    if body.get("type") == "event_callback":
+        return body.get("event", {}).get("type", "event")
+    return body.get("type", "unknown")
+
+class EventRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, body):
+        line = json.dumps({"t": time.time(), "kind": payload_kind(body), "body": redact(body)})
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
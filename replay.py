@@ -0,0 +1,157 @@
+import os
+import logging
+import json
+import time
+import argparse
+import threading
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from extractive import extractive_summarize
+
+# Replays a JSONL capture written by recorder.py through the bot's handlers.
+# Slack Web API and response_url calls go to a local stub server, summaries use
+# the local extractive summarizer, doc Q&A uses a stub index and answerer, and
+# doc links return placeholder text, so a replay never touches Slack, Gemini
+# or Confluence.
+#
+#   python replay.py recorded_events.jsonl --speed 10
+#   python replay.py recorded_events.jsonl --speed 0   # as fast as possible
+
+STUB_DOC_TEXT = "Placeholder documentation page used during replay. " * 40
+stub_calls = {}
+stub_lock = threading.Lock()
+last_stub_call = [time.monotonic()]
+
+def stub_history(size):
+    return [
+        {"type": "message", "user": f"U0STUB{i % 7}", "ts": f"{1700000000 + i}.000100",
+         "text": f"Stub message {i}: we should review the release checklist and fix ticket {i % 13}."}
+        for i in range(size, 0, -1)
+    ]
+
+def stub_response(method, params, history_size):
+    if method == "auth.test":
+        return {"ok": True, "user_id": "U0BOT", "bot_id": "B0BOT", "team_id": "T0STUB", "user": "bot", "team": "replay"}
+    if method == "conversations.open":
+        return {"ok": True, "channel": {"id": "D" + params.get("users", "U0STUB")[1:]}}
+    if method == "conversations.info":
+        return {"ok": True, "channel": {"id": params.get("channel"), "is_private": True}}
+    if method in ("conversations.history", "conversations.replies"):
+        return {"ok": True, "messages": stub_history(history_size), "has_more": False}
+    if method == "conversations.members":
+        return {"ok": True, "members": [f"U0STUB{i}" for i in range(7)], "response_metadata": {"next_cursor": ""}}
+    if method == "conversations.list":
+        return {"ok": True, "channels": [], "response_metadata": {"next_cursor": ""}}
+    if method == "users.list":
+        return {"ok": True, "members": [{"id": f"U0STUB{i}", "name": f"stub{i}"} for i in range(7)], "response_metadata": {"next_cursor": ""}}
+    if method == "users.info":
+        return {"ok": True, "user": {"id": params.get("user"), "name": "stub"}}
+    return {"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"}
+
+class StubSlackHandler(BaseHTTPRequestHandler):
+    history_size = 200
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        if "json" in self.headers.get("Content-Type", ""):
+            params = json.loads(raw or "{}")
+        else:
+            params = {k: v[0] for k, v in parse_qs(raw).items()}
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        with stub_lock:
+            stub_calls[method] = stub_calls.get(method, 0) + 1
+            last_stub_call[0] = time.monotonic()
+        payload = json.dumps(stub_response(method, params, self.history_size)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubDocIndex:
+    # Always "has" one chunk so DM questions take the Q&A path without embeddings
+    def __len__(self):
+        return 1
+
+    def search(self, question, k=4):
+        return [{"url": "https://docs.invalid/replay", "text": STUB_DOC_TEXT, "score": 1.0}]
+
+def stub_answer_question(question, context_chunks, **kwargs):
+    return extractive_summarize("\n".join(context_chunks))
+
+def load_events(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Slack payloads against local stubs")
+    parser.add_argument("path", help="JSONL file written by recorder.py")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 for as fast as possible (default: %(default)s)")
+    parser.add_argument("--history-size", type=int, default=200, help="messages returned by stubbed history/replies calls (default: %(default)s)")
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds without stub calls before handlers count as finished (default: %(default)s)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    # Everything below must be set before the bot module is imported
+    os.environ.setdefault("SLACK_BOT_TOKEN", "xoxb-replay")
+    os.environ.setdefault("SLACK_APP_TOKEN", "xapp-replay")
+    os.environ.setdefault("GEMINI_API_KEY", "replay")
+    os.environ["SUMMARY_MODE"] = "extractive"
+    os.environ.pop("RECORD_EVENTS_PATH", None)
+
+    StubSlackHandler.history_size = args.history_size
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubSlackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    # The App objects are built at import time, so the stub URL must be set first
+    os.environ["SLACK_API_URL"] = f"{stub_url}/api/"
+
+    import bot
+    from summarizer import get_model_scheduler
+    from slack_bolt.request import BoltRequest
+    bot.fetch_link_content = lambda link: STUB_DOC_TEXT
+    bot.doc_index = StubDocIndex()
+    bot.answer_question = stub_answer_question
+
+    events = load_events(args.path)
+    if not events:
+        print("No events to replay.")
+        return
+    latencies = {}
+    first_t = events[0]["t"]
+    started = time.monotonic()
+    for event in events:
+        if args.speed > 0:
+            delay = (event["t"] - first_t) / args.speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        body = event["body"]
+        if "response_url" in body:
+            body["response_url"] = f"{stub_url}/response"
+        dispatch_started = time.perf_counter()
+        bot.app.dispatch(BoltRequest(body=body, mode="socket_mode"))
+        latencies.setdefault(event["kind"], []).append(time.perf_counter() - dispatch_started)
+    dispatched = time.monotonic() - started
+
+    # Listeners run on Bolt's thread pool after ack; wait until they go quiet
+    while time.monotonic() - last_stub_call[0] < args.drain:
+        time.sleep(0.1)
+    server.shutdown()
+
+    print(f"Replayed {len(events)} payloads in {dispatched:.2f}s at {'max' if args.speed <= 0 else f'{args.speed:g}x'} speed")
+    for kind, values in sorted(latencies.items()):
+        print(f"  {kind}: {len(values)} dispatched, ack p50 {percentile(values, 50) * 1000:.1f} ms, "
+              f"p95 {percentile(values, 95) * 1000:.1f} ms, max {max(values) * 1000:.1f} ms")
+    print(f"Stub API calls: {dict(sorted(stub_calls.items()))}")
+    print(f"Rate limiter counters: {bot.slack_limiter.stats()}")
+    print(f"Model scheduler: {get_model_scheduler().stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import time
+import threading
+from concurrent.futures import Future
+from slack_sdk.errors import SlackApiError
+
+# Rate-limit-aware wrapper around the Slack WebClient.
+# Every Web API call goes through a token bucket for its method tier, 429s are
+# retried after Retry-After, identical in-flight read calls share one request
+# and calls/retries/errors are counted per method.
+
+# Requests per minute for each Slack rate limit tier
+TIER_RATES = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "auth_test": 4,
+    "chat_postMessage": "post",
+    "conversations_history": 3,
+    "conversations_info": 3,
+    "conversations_invite": 3,
+    "conversations_list": 2,
+    "conversations_members": 4,
+    "conversations_open": 3,
+    "conversations_replies": 3,
+    "users_info": 4,
+    "users_list": 2,
+}
+DEFAULT_TIER = 3
+# chat.postMessage allows about one message per second per channel
+POST_RATE_PER_MINUTE = 60
+# Read calls with identical arguments that are in flight at the same time are coalesced
+READ_METHODS = {
+    "conversations_history", "conversations_info", "conversations_list", "conversations_members",
+    "conversations_replies", "users_info", "users_list",
+}
+MAX_RETRIES = 3
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1, rate_per_minute // 10)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # After a 429 nobody else may call this tier until Retry-After has passed
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+def retry_after_seconds(response):
+    for name, value in (response.headers or {}).items():
+        if name.lower() == "retry-after":
+            value = value[0] if isinstance(value, list) else value
+            return int(value)
+    return 1
+
+class SlackRateLimiter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.inflight = {}
+        self.counters = {}
+
+    def bucket(self, method, kwargs):
+        tier = METHOD_TIERS.get(method, DEFAULT_TIER)
+        key = (tier, kwargs.get("channel")) if tier == "post" else (tier,)
+        with self.lock:
+            if key not in self.buckets:
+                rate = POST_RATE_PER_MINUTE if tier == "post" else TIER_RATES[tier]
+                self.buckets[key] = TokenBucket(rate)
+            return self.buckets[key]
+
+    def count(self, method, counter):
+        with self.lock:
+            counts = self.counters.setdefault(method, {"calls": 0, "coalesced": 0, "retries": 0, "errors": 0})
+            counts[counter] += 1
+
+    def stats(self):
+        with self.lock:
+            return {method: dict(counts) for method, counts in self.counters.items()}
+
+    def call(self, method, func, *args, **kwargs):
+        self.count(method, "calls")
+        if method not in READ_METHODS:
+            return self.call_with_retry(method, func, *args, **kwargs)
+        key = (method, repr(args), repr(sorted(kwargs.items())))
+        with self.lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self.inflight[key] = Future()
+        if not owner:
+            self.count(method, "coalesced")
+            return future.result()
+        try:
+            future.set_result(self.call_with_retry(method, func, *args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+        return future.result()
+
+    def call_with_retry(self, method, func, *args, **kwargs):
+        bucket = self.bucket(method, kwargs)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                return func(*args, **kwargs)
+            except SlackApiError as e:
+                if e.response.status_code != 429 or attempt >= MAX_RETRIES:
+                    self.count(method, "errors")
+                    raise
+                retry_after = retry_after_seconds(e.response)
+                print(f"Rate limited on {method}, retrying in {retry_after}s")
+                self.count(method, "retries")
+                bucket.pause(retry_after)
+                attempt += 1
+            except Exception:
+                self.count(method, "errors")
+                raise
+
+class RateLimitedClient:
+    # Drop-in replacement for a WebClient; API methods are routed through the limiter
+    def __init__(self, client, limiter):
+        self.client = client
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        def call(*args, **kwargs):
+            return self.limiter.call(name, attr, *args, **kwargs)
+        return call
+
+slack_limiter = SlackRateLimiter()
@@ -0,0 +1,92 @@
+import os
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+import google.generativeai as genai
+from extractive import extractive_summarize
+from model_scheduler import ModelScheduler, PRIORITY_INTERACTIVE, PRIORITY_COMMAND
+
+# Gemini plumbing shared by the bot and the offline tools: every model call
+# goes through a ModelScheduler, and summaries can fall back to the local
+# extractive summarizer. Nothing here talks to Slack, so the offline digest
+# can use it without Slack app credentials.
+
+# Load environment variables from .env if present
+load_dotenv(dotenv_path=Path('.') / '.env')
+
+# Set your Gemini API key
+os.environ["GEMINI_API_KEY"] = os.getenv("GEMINI_API_KEY", os.environ.get("GEMINI_API_KEY", ""))
+genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+model = genai.GenerativeModel("gemini-1.5-flash")
+
+# Summary mode: "model" (Gemini only), "extractive" (local only) or "auto"
+# (Gemini, falling back to the local summarizer past the deadline or on error)
+SUMMARY_MODE = os.environ.get("SUMMARY_MODE", "auto")
+SUMMARY_DEADLINE_SECONDS = float(os.environ.get("SUMMARY_DEADLINE_SECONDS", "20"))
+
+# Limits for the default scheduler, which every Gemini call in the bot process
+# goes through so bulk work can't starve DMs. Other processes (digest.py) pass
+# their own scheduler instead; the limits are per process, not global.
+MODEL_CONCURRENCY = int(os.environ.get("MODEL_CONCURRENCY", "4"))
+MODEL_TOKENS_PER_MINUTE = int(os.environ.get("MODEL_TOKENS_PER_MINUTE", "250000"))
+default_scheduler = None
+default_scheduler_lock = threading.Lock()
+
+def get_model_scheduler():
+    # Created on first use, so processes that bring their own scheduler don't
+    # start idle workers
+    global default_scheduler
+    with default_scheduler_lock:
+        if default_scheduler is None:
+            default_scheduler = ModelScheduler(MODEL_CONCURRENCY, MODEL_TOKENS_PER_MINUTE)
+        return default_scheduler
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return len(text) // 4 + 1
+
+def run_model(fn, *args, priority=PRIORITY_COMMAND, timeout=None, tokens=0, scheduler=None, **kwargs):
+    scheduler = scheduler or get_model_scheduler()
+    future = scheduler.submit(fn, *args, priority=priority, timeout=timeout, tokens=tokens, **kwargs)
+    try:
+        return future.result(timeout=timeout)
+    except Exception:
+        # Drop the request if it is still waiting in the queue
+        future.cancel()
+        raise
+
+def generate_text(prompt, priority=PRIORITY_COMMAND, timeout=None, scheduler=None):
+    response = run_model(model.generate_content, prompt, priority=priority, timeout=timeout,
+                         tokens=estimate_tokens(prompt), scheduler=scheduler)
+    return response.text
+
+def summarize_text(text, mode=None, deadline=None, priority=PRIORITY_COMMAND, scheduler=None):
+    mode = mode or SUMMARY_MODE
+    if mode == "extractive":
+        return extractive_summarize(text)
+    prompt = (
+        "You are an expert technical writer. Read the following content and provide a structured summary. "
+        "Your summary should include:\n"
+        "1. A TL;DR (1-2 sentences)\n"
+        "2. Key Points (bulleted list)\n"
+        "3. Action Items (if any, as a bulleted list)\n"
+        "If the content is not useful or looks like an error page, say so.\n\n"
+        f"Content:\n{text}"
+    )
+    if mode == "model":
+        return generate_text(prompt, priority, deadline, scheduler)
+    try:
+        return generate_text(prompt, priority, deadline or SUMMARY_DEADLINE_SECONDS, scheduler)
+    except Exception as e:
+        print(f"Falling back to extractive summary: {e!r}")
+        return extractive_summarize(text)
+
+def answer_question(question, context_chunks, priority=PRIORITY_INTERACTIVE, deadline=None, scheduler=None):
+    context = "\n\n---\n\n".join(context_chunks)
+    prompt = (
+        "You are an onboarding assistant. Answer the question using only the documentation excerpts below. "
+        "Be concise. If the excerpts do not contain the answer, say so.\n\n"
+        f"Excerpts:\n{context}\n\n"
+        f"Question: {question}"
+    )
+    return generate_text(prompt, priority, deadline, scheduler)